@@ -5,49 +5,94 @@
 
 import os
 import re
-import time
+import sys
 import logging
 import random
-import json
 import argparse
 import asyncio
 import base64
-from collections import deque
-from urllib.parse import urlparse, urljoin, urldefrag
-from typing import List, Optional, Dict, Set, Any
+import codecs
+import hashlib
+from collections import OrderedDict
+from urllib.parse import urlparse, urlsplit, urljoin
+from urllib.robotparser import RobotFileParser
+from typing import List, Optional, Dict, Set, Any, Tuple, Union
 
 # Third-party imports
-from pydantic import BaseModel, Field
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+import httpx
+import orjson
+from bs4 import BeautifulSoup, SoupStrainer
+from selectolax.lexbor import LexborHTMLParser
 import html2text
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAioHttpClient
 
 # --- Configuration ---
 # Environment variables are loaded by the n8n environment on Render.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 DATA_FOR_SEO_LOGIN = os.getenv("DATA_FOR_SEO_LOGIN")
 DATA_FOR_SEO_PASSWORD = os.getenv("DATA_FOR_SEO_PASSWORD")
+# Set SCRAPER_HTML_PARSER=bs4 to fall back to BeautifulSoup for badly malformed markup.
+USE_BS4_PARSER = os.getenv("SCRAPER_HTML_PARSER", "selectolax").lower() == "bs4"
+# Set SCRAPER_CACHE_DIR to keep extracted pages on disk between runs (revalidated with conditional GETs).
+CACHE_DIR = os.getenv("SCRAPER_CACHE_DIR")
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+FETCH_RETRIES = 3
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# One pooled client for the whole run so pages on the same host reuse keep-alive connections.
+CLIENT = httpx.AsyncClient(
+    timeout=30.0,
+    follow_redirects=True,
+    headers={'User-Agent': USER_AGENT},
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    ),
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # --- Pydantic Models for Data Structure ---
+# Each pattern is compiled on its own so inline flags and group numbers keep their meaning.
+def compile_patterns(patterns: Optional[List[str]]) -> List[re.Pattern]:
+    compiled = []
+    for pattern in patterns or []:
+        try:
+            compiled.append(re.compile(pattern, re.I))
+        except re.error as e:
+            raise ValueError(f"invalid URL pattern {pattern!r}: {e}") from e
+    return compiled
+
 class ScrapePageOptions(BaseModel):
     ai_analysis: bool = Field(False)
     ai_prompt: Optional[str] = Field("Summarize this content in 3 bullet points.")
     client_summary: Optional[List[str]] = None
+    # With ai_analysis and this off, only the start of each page is converted to markdown.
+    return_full_markdown: bool = Field(True)
 
 class CrawlerOptions(BaseModel):
     max_pages: int = Field(20)
     max_depth: int = Field(3)
     delay_seconds: float = Field(1.0)
+    concurrency: int = Field(10, ge=1)
     same_domain_only: bool = Field(True)
     respect_robots: bool = Field(True)
     include_patterns: Optional[List[str]] = None
     exclude_patterns: Optional[List[str]] = Field(default_factory=list)
+    _include_res: List[re.Pattern] = PrivateAttr(default_factory=list)
+    _exclude_res: List[re.Pattern] = PrivateAttr(default_factory=list)
+
+    @model_validator(mode="after")
+    def _compile_patterns(self):
+        # Compiled once here rather than re-parsed by re.search for every link.
+        self._include_res = compile_patterns(self.include_patterns)
+        self._exclude_res = compile_patterns(self.exclude_patterns)
+        return self
 
 class ScrapeResult(BaseModel):
     url: str
@@ -78,62 +123,154 @@ class SerpResponse(BaseModel):
     results: List[SerpResult]
 
 # --- Helper Functions ---
-def make_resilient_request(url: str, timeout: int = 15) -> requests.Response:
-    session = requests.Session()
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-    session.headers.update(headers)
-    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    response = session.get(url, timeout=timeout)
-    response.raise_for_status()
+async def fetch(url: str, timeout: float = 15.0, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    for attempt in range(FETCH_RETRIES + 1):
+        response = await CLIENT.get(url, timeout=timeout, headers=headers)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == FETCH_RETRIES:
+            break
+        await asyncio.sleep(2 ** attempt)
+    # 304 only comes back for conditional requests, which the caller handles.
+    if response.status_code != 304:
+        response.raise_for_status()
     return response
 
-def html_to_markdown(html_content: str) -> str:
-    if not html_content: return ""
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+# Resolves the page encoding from the Content-Type header or a <meta charset> near the top,
+# without a chardet-style guess. UTF-8 pages stay as bytes, since selectolax decodes those
+# natively; anything else is decoded once here because lexbor assumes UTF-8 for bytes input.
+def page_html(response: httpx.Response) -> Union[str, bytes]:
+    raw = response.content
+    encoding = response.charset_encoding
+    if not encoding:
+        match = META_CHARSET_RE.search(raw, 0, 2048)
+        encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        if codecs.lookup(encoding).name == 'utf-8':
+            return raw
+        return raw.decode(encoding, errors='replace')
+    except LookupError:
+        return raw
+
+# HTML2Text keeps state (abbreviations, table/pre counters) across handle() calls, so each page gets its own.
+def _new_h2t() -> html2text.HTML2Text:
     h = html2text.HTML2Text()
     h.ignore_links = False
     h.body_width = 0
-    return h.handle(html_content)
+    return h
+
+def html_to_markdown(html_content: str) -> str:
+    if not html_content: return ""
+    return _new_h2t().handle(html_content)
 
-def extract_metadata(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "html.parser")
+NON_TEXT_TAGS = {'script', 'style'}
+NON_CONTENT_TAGS = ['script', 'style', 'noscript']
+# ~32 KB of body HTML comfortably yields the 8 KB of markdown perform_ai_analysis sends.
+AI_MARKDOWN_HTML_LIMIT = 32_000
+
+# Strainers let BeautifulSoup skip building tree nodes for everything outside the tags we read.
+HEAD_STRAINER = SoupStrainer(['title', 'meta'])
+BODY_STRAINER = SoupStrainer('body')
+
+def make_soup(html, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    # page_html only hands over bytes when they are UTF-8, so spare BeautifulSoup its encoding sniffing.
+    from_encoding = 'utf-8' if isinstance(html, bytes) else None
+    # lxml parses in C; fall back to the pure-Python parser for pages lxml chokes on.
+    try:
+        return BeautifulSoup(html, "lxml", parse_only=parse_only, from_encoding=from_encoding)
+    except Exception:
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only, from_encoding=from_encoding)
+
+# Counts words string by string rather than materialising the whole page text; script/style bodies are skipped.
+def count_words(tree: Union[LexborHTMLParser, BeautifulSoup]) -> int:
+    if isinstance(tree, BeautifulSoup):
+        # stripped_strings already leaves out <script>/<style> contents.
+        return sum(len(s.split()) for s in (tree.body or tree).stripped_strings)
+    if tree.body is None:
+        return 0
+    return sum(
+        len(node.text(deep=False).split())
+        for node in tree.body.traverse(include_text=True)
+        if node.tag == '-text' and node.parent.tag not in NON_TEXT_TAGS
+    )
+
+def _extract_metadata_bs4(head: BeautifulSoup, body: BeautifulSoup) -> Dict[str, Any]:
     metadata = {}
-    title_tag = soup.find('title')
+    title_tag = head.find('title')
     metadata['title'] = title_tag.get_text().strip() if title_tag else ""
-    desc_tag = soup.find('meta', attrs={'name': 'description'})
+    desc_tag = head.find('meta', attrs={'name': 'description'})
     metadata['description'] = desc_tag.get('content', '').strip() if desc_tag else ""
-    h1_tags = soup.find_all('h1')
+    h1_tags = body.find_all('h1')
     metadata['h1_tags'] = [h1.get_text().strip() for h1 in h1_tags]
-    h2_tags = soup.find_all('h2')
+    h2_tags = body.find_all('h2')
     metadata['h2_tags'] = [h2.get_text().strip() for h2 in h2_tags[:10]]
-    visible_text = soup.get_text()
-    metadata['word_count'] = len(visible_text.split())
+    metadata['word_count'] = count_words(body)
     return metadata
 
-def extract_links(soup: BeautifulSoup, base_url: str) -> Set[str]:
+def extract_metadata(tree: LexborHTMLParser) -> Dict[str, Any]:
+    metadata = {}
+    title_node = tree.css_first('title')
+    metadata['title'] = title_node.text().strip() if title_node else ""
+    desc_node = tree.css_first('meta[name="description"]')
+    metadata['description'] = (desc_node.attributes.get('content') or '').strip() if desc_node else ""
+    metadata['h1_tags'] = [h1.text().strip() for h1 in tree.css('h1')]
+    metadata['h2_tags'] = [h2.text().strip() for h2 in tree.css('h2')[:10]]
+    metadata['word_count'] = count_words(tree)
+    return metadata
+
+def extract_links(tree: Union[LexborHTMLParser, BeautifulSoup], base_url: str) -> Set[str]:
+    if isinstance(tree, BeautifulSoup):
+        hrefs = (a_tag['href'] for a_tag in tree.find_all('a', href=True))
+    else:
+        hrefs = (node.attributes.get('href') or '' for node in tree.css('a[href]'))
     links = set()
-    for a_tag in soup.find_all('a', href=True):
-        href = a_tag['href'].strip()
+    for href in hrefs:
+        href = href.strip()
         if href:
-            absolute_url = urljoin(base_url, href)
-            absolute_url = urldefrag(absolute_url)[0]
-            links.add(absolute_url)
+            # Absolute links skip urljoin; a plain partition drops the fragment without building a ParseResult.
+            absolute_url = href if href.startswith(('http://', 'https://')) else urljoin(base_url, href)
+            links.add(absolute_url.partition('#')[0])
     return links
 
+def body_to_markdown(body_html: str, limit: Optional[int] = None) -> str:
+    if limit and len(body_html) > limit:
+        # Re-parse the cut so html2text gets balanced markup rather than a tag sliced in half.
+        body_html = LexborHTMLParser(body_html[:limit]).body.html
+    return html_to_markdown(body_html)
+
+# Returns (markdown, metadata, links) from a single selectolax parse. Only the
+# <body>, minus script/style/noscript, is handed to html2text.
+def extract_page(html, base_url: str, markdown_limit: Optional[int] = None) -> Tuple[str, Dict[str, Any], Set[str]]:
+    if USE_BS4_PARSER:
+        # A strained parse for <title>/<meta>; the <body> parse serves everything else.
+        head = make_soup(html, HEAD_STRAINER)
+        body = make_soup(html, BODY_STRAINER)
+        if body.body is None:
+            body = make_soup(html)
+        metadata = _extract_metadata_bs4(head, body)
+        links = extract_links(body, base_url)
+        for tag in body(NON_CONTENT_TAGS):
+            tag.decompose()
+        return body_to_markdown(str(body.body or body), markdown_limit), metadata, links
+
+    tree = LexborHTMLParser(html)
+    metadata = extract_metadata(tree)
+    links = extract_links(tree, base_url)
+    tree.strip_tags(NON_CONTENT_TAGS)
+    return body_to_markdown(tree.body.html if tree.body else "", markdown_limit), metadata, links
+
 def is_valid_url(url: str, options: CrawlerOptions, base_domain: str) -> bool:
     try:
-        parsed_url = urlparse(url)
-        if parsed_url.scheme not in ['http', 'https']: return False
+        parsed_url = urlsplit(url)
+        if parsed_url.scheme not in ('http', 'https'): return False
         if options.same_domain_only and parsed_url.netloc != base_domain: return False
-        if options.exclude_patterns and any(re.search(p, url, re.I) for p in options.exclude_patterns): return False
-        if options.include_patterns and not any(re.search(p, url, re.I) for p in options.include_patterns): return False
+        if any(r.search(url) for r in options._exclude_res): return False
+        if options._include_res and not any(r.search(url) for r in options._include_res): return False
         return True
     except Exception:
         return False
 
-def get_dataforseo_serp(keyword: str, location_code: int, num_results: int = 5) -> List[str]:
+async def get_dataforseo_serp(keyword: str, location_code: int, num_results: int = 5) -> List[str]:
     if not DATA_FOR_SEO_LOGIN or not DATA_FOR_SEO_PASSWORD:
         logging.error("❌ DataForSEO credentials not set in environment variables.")
         return []
@@ -143,7 +280,7 @@ def get_dataforseo_serp(keyword: str, location_code: int, num_results: int = 5)
     payload = [{"keyword": keyword, "location_code": location_code, "language_name": "English", "depth": num_results}]
     
     try:
-        response = requests.post("https://api.dataforseo.com/v3/serp/google/organic/live/regular", headers=headers, json=payload)
+        response = await CLIENT.post("https://api.dataforseo.com/v3/serp/google/organic/live/regular", headers=headers, json=payload, timeout=30)
         response.raise_for_status()
         result = response.json()
         items = result.get("tasks", [{}])[0].get("result", [{}])[0].get("items", [])
@@ -154,11 +291,27 @@ def get_dataforseo_serp(keyword: str, location_code: int, num_results: int = 5)
         logging.error(f"❌ DataForSEO API call failed: {e}")
         return []
 
+# Created lazily: the aiohttp session must be opened inside the running event loop.
+_OAI_CLIENT: Optional[AsyncOpenAI] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    global _OAI_CLIENT
+    if _OAI_CLIENT is None:
+        _OAI_CLIENT = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=DefaultAioHttpClient())
+    return _OAI_CLIENT
+
+async def close_openai_client() -> None:
+    # Drop the cached client too, so a later event loop gets a fresh one instead of a closed session.
+    global _OAI_CLIENT
+    if _OAI_CLIENT is not None:
+        client, _OAI_CLIENT = _OAI_CLIENT, None
+        await client.close()
+
 async def perform_ai_analysis(page_content: str, prompt: str) -> (Optional[str], Optional[str]):
     if not OPENAI_API_KEY:
         logging.warning("⚠️ OpenAI API key not found. Skipping AI summary.")
         return None, "N/A"
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    client = get_openai_client()
     try:
         response = await client.chat.completions.create(
             model="gpt-4o",
@@ -169,18 +322,128 @@ async def perform_ai_analysis(page_content: str, prompt: str) -> (Optional[str],
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-        return json.loads(response.choices[0].message.content), "gpt-4o"
+        return orjson.loads(response.choices[0].message.content), "gpt-4o"
     except Exception as e:
         logging.error(f"❌ OpenAI call failed: {e}")
         return {"error": f"AI analysis failed: {e}"}, "N/A"
 
 # --- Core Logic ---
-async def scrape_url(url: str, options: ScrapePageOptions) -> ScrapeResult:
+class PageCache:
+    # Extracted pages on disk, one JSON file per sha256(url). Entries are only kept for responses
+    # carrying an ETag or Last-Modified, so every hit can be revalidated with a conditional GET.
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def load(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(url), "rb") as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def store(self, url: str, response: httpx.Response, markdown: str, metadata: Dict[str, Any], links: Set[str]) -> None:
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if not (etag or last_modified):
+            return
+        entry = {"etag": etag, "last_modified": last_modified, "markdown": markdown, "metadata": metadata, "links": sorted(links)}
+        path = self._path(url)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(orjson.dumps(entry))
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.warning(f"⚠️ Could not write cache entry for {url}: {e}")
+
+PAGE_CACHE = PageCache(CACHE_DIR) if CACHE_DIR else None
+
+# Fetches and extracts a page as (markdown, metadata, links), serving it from PAGE_CACHE when the server answers 304.
+async def load_page(url: str, markdown_limit: Optional[int] = None) -> Tuple[str, Dict[str, Any], Set[str]]:
+    cached = PAGE_CACHE.load(url) if PAGE_CACHE else None
+    headers = {}
+    if cached:
+        if cached.get("etag"): headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"): headers["If-Modified-Since"] = cached["last_modified"]
+    response = await fetch(url, headers=headers)
+    if cached and response.status_code == 304:
+        return cached["markdown"], cached["metadata"], set(cached["links"])
+    response.raise_for_status()
+    markdown_content, metadata, links = extract_page(page_html(response), url, markdown_limit)
+    # A cached entry must hold the full markdown; a hit can always be served to a truncating caller.
+    if PAGE_CACHE and not markdown_limit:
+        PAGE_CACHE.store(url, response, markdown_content, metadata, links)
+    return markdown_content, metadata, links
+
+async def fetch_robots(origin: str) -> RobotFileParser:
+    # Same status handling as RobotFileParser.read(), but over the pooled async client.
+    parser = RobotFileParser(f"{origin}/robots.txt")
+    try:
+        response = await CLIENT.get(parser.url, timeout=10)
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+    except Exception as e:
+        logging.warning(f"⚠️ Could not fetch {parser.url}: {e}")
+        parser.allow_all = True
+    return parser
+
+class RobotsCache:
+    # Per-crawl LRU of robots.txt parsers, so each origin's rules are fetched once.
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._parsers: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parsed_url = urlsplit(url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc}"
+
+    def _parser_task(self, origin: str) -> "asyncio.Task":
+        task = self._parsers.get(origin)
+        if task is None:
+            # Store the task, not the result, so concurrent lookups share one fetch.
+            task = self._parsers[origin] = asyncio.ensure_future(fetch_robots(origin))
+            if len(self._parsers) > self.maxsize:
+                self._parsers.popitem(last=False)
+        else:
+            self._parsers.move_to_end(origin)
+        return task
+
+    async def prefetch(self, urls: List[str]) -> None:
+        # Fetch robots.txt for every distinct origin at once rather than one origin per allowed() call.
+        await asyncio.gather(*(self._parser_task(origin) for origin in {self._origin(url) for url in urls}))
+
+    async def allowed(self, url: str) -> bool:
+        parser = await self._parser_task(self._origin(url))
+        return parser.can_fetch(USER_AGENT, url)
+
+class HostThrottle:
+    # Spaces out request start times per host by `delay` seconds without holding up other hosts.
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, url: str) -> None:
+        host = urlsplit(url).netloc
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+# Returns the page's links alongside the result so the crawler needn't refetch or reparse it.
+async def scrape_url(url: str, options: ScrapePageOptions) -> Tuple[ScrapeResult, Set[str]]:
     try:
-        response = make_resilient_request(url)
-        html_content = response.text
-        markdown_content = html_to_markdown(html_content)
-        metadata = extract_metadata(html_content)
+        # The AI prompt only reads the first few KB, so skip converting the rest when nobody else needs it.
+        markdown_limit = AI_MARKDOWN_HTML_LIMIT if options.ai_analysis and not options.return_full_markdown else None
+        markdown_content, metadata, links = await load_page(url, markdown_limit)
         
         ai_analysis = None
         model_used = "N/A"
@@ -192,66 +455,124 @@ async def scrape_url(url: str, options: ScrapePageOptions) -> ScrapeResult:
             )
             ai_analysis, model_used = await perform_ai_analysis(markdown_content, prompt)
             
-        return ScrapeResult(url=url, status="success", markdown=markdown_content, metadata=metadata, ai_analysis={"summary": ai_analysis, "model_used": model_used})
+        result = ScrapeResult(url=url, status="success", markdown=markdown_content, metadata=metadata, ai_analysis={"summary": ai_analysis, "model_used": model_used})
+        return result, links
     except Exception as e:
-        return ScrapeResult(url=url, status="error", error=str(e))
+        return ScrapeResult(url=url, status="error", error=str(e)), set()
 
 async def crawl_website(start_url: str, crawl_options: CrawlerOptions, page_options: ScrapePageOptions) -> CrawlResponse:
     base_domain = urlparse(start_url).netloc
-    queue = deque([(start_url, 0)])
     visited_urls = {start_url}
     scraped_results = []
+    semaphore = asyncio.Semaphore(crawl_options.concurrency)
+    throttle = HostThrottle(crawl_options.delay_seconds)
+    robots = RobotsCache() if crawl_options.respect_robots else None
+    if robots and not await robots.allowed(start_url):
+        logging.warning(f"⚠️ {start_url} is disallowed by robots.txt; nothing crawled.")
+        results = [ScrapeResult(url=start_url, status="error", error="Disallowed by robots.txt")]
+        return CrawlResponse(status="completed", start_url=start_url, total_pages_crawled=len(results), results=results)
+
+    async def bounded_scrape(url: str) -> Tuple[ScrapeResult, Set[str]]:
+        # Sit out the per-host delay before taking a slot so one busy host can't idle the whole pool.
+        await throttle.wait(url)
+        async with semaphore:
+            return await scrape_url(url, page_options)
+
+    # Breadth-first, one depth layer at a time; pages within a layer are scraped concurrently.
+    frontier = [start_url]
+    current_depth = 0
+    while frontier and len(scraped_results) < crawl_options.max_pages and current_depth <= crawl_options.max_depth:
+        layer = frontier[:crawl_options.max_pages - len(scraped_results)]
+        for i, url in enumerate(layer, start=len(scraped_results) + 1):
+            logging.info(f"Crawling [{i}/{crawl_options.max_pages}] URL: {url} (Depth: {current_depth})")
+        outcomes = await asyncio.gather(*(bounded_scrape(url) for url in layer))
+
+        scraped_results.extend(scrape_result for scrape_result, _ in outcomes)
+        # Only this many URLs of the next layer can ever be scraped, so stop collecting (and
+        # remembering) links there; visited_urls then stays bounded by max_pages.
+        budget = crawl_options.max_pages - len(scraped_results)
+        next_frontier = []
+        if current_depth < crawl_options.max_depth and budget > 0:
+            candidates = list(dict.fromkeys(
+                link
+                for scrape_result, new_links in outcomes if scrape_result.status == "success"
+                for link in new_links
+                if link not in visited_urls and is_valid_url(link, crawl_options, base_domain)
+            ))
+            # Take candidates in batches no larger than the open frontier slots, so robots.txt is only
+            # fetched for links that can still be crawled (and a batch never overflows the LRU).
+            position = 0
+            while position < len(candidates) and len(next_frontier) < budget:
+                batch_size = budget - len(next_frontier)
+                if robots:
+                    batch_size = min(batch_size, robots.maxsize)
+                batch = candidates[position:position + batch_size]
+                position += len(batch)
+                if robots:
+                    await robots.prefetch(batch)
+                for link in batch:
+                    visited_urls.add(link)
+                    if robots and not await robots.allowed(link):
+                        continue
+                    next_frontier.append(link)
+
+        frontier = next_frontier
+        current_depth += 1
 
-    while queue and len(scraped_results) < crawl_options.max_pages:
-        current_url, current_depth = queue.popleft()
-        if current_depth > crawl_options.max_depth: continue
+    return CrawlResponse(status="completed", start_url=start_url, total_pages_crawled=len(scraped_results), results=scraped_results)
 
-        logging.info(f"Crawling [{len(scraped_results) + 1}/{crawl_options.max_pages}] URL: {current_url} (Depth: {current_depth})")
-        scrape_result = await scrape_url(current_url, page_options)
-        scraped_results.append(scrape_result)
+async def scrape_serp_result(keyword: str, url: str) -> SerpResult:
+    logging.info(f"Scraping SERP result for '{keyword}': {url}")
+    try:
+        markdown_content, metadata, _ = await load_page(url)
+        
+        prompt = f"Analyze this competitor page that ranks for the keyword '{keyword}'. Summarize their content strategy, main topics, and page structure in a JSON object with keys 'page_topic', 'relevant_keywords', and 'strategy_summary'."
+        ai_analysis, model_used = await perform_ai_analysis(markdown_content, prompt)
 
-        if scrape_result.status == "success" and current_depth < crawl_options.max_depth:
-            try:
-                response = make_resilient_request(current_url)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                new_links = extract_links(soup, current_url)
-                for link in new_links:
-                    if link not in visited_urls and is_valid_url(link, crawl_options, base_domain):
-                        visited_urls.add(link)
-                        queue.append((link, current_depth + 1))
-            except Exception as e:
-                logging.warning(f"⚠️ Could not extract links from {current_url}: {e}")
+        return SerpResult(
+            keyword=keyword, url=url, status="success", markdown=markdown_content,
+            metadata=metadata, ai_analysis={"summary": ai_analysis, "model_used": model_used}
+        )
+    except Exception as e:
+        return SerpResult(keyword=keyword, url=url, status="error", error=str(e))
 
-        time.sleep(crawl_options.delay_seconds)
+async def serp_scrape(keywords: List[str], location_code: int, num_results: int, concurrency: int = 10) -> SerpResponse:
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    semaphore = asyncio.Semaphore(concurrency)
+    throttle = HostThrottle(1.0) # Delay between scraping SERP results on the same host
 
-    return CrawlResponse(status="completed", start_url=start_url, total_pages_crawled=len(scraped_results), results=scraped_results)
+    async def bounded_scrape(keyword: str, url: str) -> SerpResult:
+        await throttle.wait(url)
+        async with semaphore:
+            return await scrape_serp_result(keyword, url)
+
+    serp_urls = await asyncio.gather(*(get_dataforseo_serp(keyword, location_code, num_results) for keyword in keywords))
+    # Every (keyword, url) pair is independent, so scrape them all under one semaphore
+    # rather than waiting for one keyword's results before starting the next.
+    pairs = [(keyword, url) for keyword, urls in zip(keywords, serp_urls) for url in urls]
+    all_results = await asyncio.gather(*(bounded_scrape(keyword, url) for keyword, url in pairs))
 
-async def serp_scrape(keywords: List[str], location_code: int, num_results: int) -> SerpResponse:
-    all_results = []
-    for keyword in keywords:
-        urls = get_dataforseo_serp(keyword, location_code, num_results)
-        for url in urls:
-            logging.info(f"Scraping SERP result for '{keyword}': {url}")
-            try:
-                response = make_resilient_request(url)
-                html_content = response.text
-                markdown_content = html_to_markdown(html_content)
-                metadata = extract_metadata(html_content)
-                
-                prompt = f"Analyze this competitor page that ranks for the keyword '{keyword}'. Summarize their content strategy, main topics, and page structure in a JSON object with keys 'page_topic', 'relevant_keywords', and 'strategy_summary'."
-                ai_analysis, model_used = await perform_ai_analysis(markdown_content, prompt)
-
-                all_results.append(SerpResult(
-                    keyword=keyword, url=url, status="success", markdown=markdown_content,
-                    metadata=metadata, ai_analysis={"summary": ai_analysis, "model_used": model_used}
-                ))
-            except Exception as e:
-                all_results.append(SerpResult(keyword=keyword, url=url, status="error", error=str(e)))
-            time.sleep(1.0) # Delay between scraping SERP results
-            
     return SerpResponse(status="completed", keywords_processed=keywords, results=all_results)
 
 # --- Command-Line Interface (CLI) ---
+def url_pattern(value: str) -> str:
+    try:
+        re.compile(value)
+    except re.error as e:
+        raise argparse.ArgumentTypeError(f"invalid regex {value!r}: {e}")
+    return value
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def write_json(result: BaseModel) -> None:
+    sys.stdout.buffer.write(orjson.dumps(result.model_dump(), option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+    sys.stdout.buffer.flush()
+
 async def main():
     parser = argparse.ArgumentParser(description="A Firecrawl-style web scraper and crawler.")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -264,31 +585,44 @@ async def main():
     p_crawl.add_argument("--delay-seconds", type=float, default=1.0)
     p_crawl.add_argument("--ai-analysis", action="store_true")
     p_crawl.add_argument("--client-summary", type=str, default="")
-    p_crawl.add_argument("--exclude-patterns", nargs='*', default=[])
+    p_crawl.add_argument("--truncate-markdown", action="store_true", help="With --ai-analysis, only convert the first ~32 KB of each page to markdown.")
+    p_crawl.add_argument("--exclude-patterns", nargs='*', type=url_pattern, default=[])
+    p_crawl.add_argument("--concurrency", type=positive_int, default=10)
+    p_crawl.add_argument("--ignore-robots", action="store_true")
 
     # --- SERP Command ---
     p_serp = subparsers.add_parser("serp", help="Scrape SERP results for keywords.")
     p_serp.add_argument("--keywords", nargs='+', required=True)
     p_serp.add_argument("--location-code", type=int, default=2840)
     p_serp.add_argument("--num-results", type=int, default=5)
+    p_serp.add_argument("--concurrency", type=positive_int, default=10)
 
     args = parser.parse_args()
 
     if args.command == "crawl":
         page_options = ScrapePageOptions(
             ai_analysis=args.ai_analysis,
-            client_summary=args.client_summary.split(';') if args.client_summary else []
+            client_summary=args.client_summary.split(';') if args.client_summary else [],
+            return_full_markdown=not args.truncate_markdown
         )
         crawl_options = CrawlerOptions(
             max_pages=args.max_pages, max_depth=args.max_depth,
-            delay_seconds=args.delay_seconds, exclude_patterns=args.exclude_patterns
+            delay_seconds=args.delay_seconds, exclude_patterns=args.exclude_patterns,
+            concurrency=args.concurrency, respect_robots=not args.ignore_robots
         )
         result = await crawl_website(args.url, crawl_options, page_options)
-        print(result.model_dump_json(indent=2))
+        write_json(result)
 
     elif args.command == "serp":
-        result = await serp_scrape(args.keywords, args.location_code, args.num_results)
-        print(result.model_dump_json(indent=2))
+        result = await serp_scrape(args.keywords, args.location_code, args.num_results, args.concurrency)
+        write_json(result)
+
+async def run():
+    try:
+        await main()
+    finally:
+        await close_openai_client()
+        await CLIENT.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
@@ -3,6 +3,7 @@
 Unified GSC (CM/LM pages) + GA4 (CM & YoY) monthly fetch
 - Can read Google OAuth creds from Postgres and refresh the access token if expired.
 - Prints a single JSON object to stdout.
+- Optionally caches API responses on disk: set MONTHLY_METRICS_CACHE_DIR (see --cache-ttl-seconds).
 
 Examples:
   python fetch_monthly_metrics.py \
@@ -18,23 +19,40 @@ If you already have an access token in env:
 DB connection discovery order:
 - --database-url (CLI)
 - env DATABASE_URL (standard on Render etc.)
-- env POSTGRES_HOST/PORT/DB/USER/PASSWORD (see get_db_conn_from_env)
+- env POSTGRES_HOST/PORT/DB/USER/PASSWORD (see _db_connect_params)
 """
 
-import os, sys, json, time, math, urllib.parse, argparse
+import os, sys, json, time, math, random, hashlib, urllib.parse, argparse, asyncio, threading, functools, operator
 from datetime import datetime, timezone, timedelta
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import aiohttp
+try:
+    import orjson
+    json_dumps_bytes, json_loads = orjson.dumps, orjson.loads
+except ImportError:  # stdlib json fallback
+    orjson = None
+    json_dumps_bytes, json_loads = (lambda obj: json.dumps(obj).encode("utf-8")), json.loads
 
 # Optional: comment out if you prefer 'psycopg' (v3)
 import psycopg2
+import psycopg2.pool
 from psycopg2.extras import RealDictCursor
 
+# Shared keep-alive session for the synchronous calls (token minting). Retries stay off at the
+# adapter level; callers decide how to handle failures.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=0)))
+
 # ---------- Helpers ----------
 def ensure_trailing_slash(u: str) -> str:
     if not u:
         return u
     return u if u.endswith('/') else u + '/'
 
+@functools.lru_cache(maxsize=8)
 def encode_site_url(raw: str) -> str:
     if not raw:
         return None
@@ -49,52 +67,102 @@ def last_full_month_anchor(today: datetime) -> datetime:
     y, m = today.year, today.month
     return first_day_utc(y-1, 12) if m == 1 else first_day_utc(y, m-1)
 
-def eom_utc(y, m):
-    if m == 12:
-        return datetime(y+1, 1, 1, tzinfo=timezone.utc) - timedelta(days=1)
-    return datetime(y, m+1, 1, tzinfo=timezone.utc) - timedelta(days=1)
+_DAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def days_in_month(y, m):
+    if m == 2 and y % 4 == 0 and (y % 100 != 0 or y % 400 == 0):
+        return 29
+    return _DAYS[m-1]
 
 def month_info_from_anchor(anchor_dt: datetime):
     y, m = anchor_dt.year, anchor_dt.month
-    start = f"{y}-{m:02d}-01"
-    end = eom_utc(y, m).strftime("%Y-%m-%d")
+    start = f"{y:04d}-{m:02d}-01"
+    end = f"{y:04d}-{m:02d}-{days_in_month(y, m):02d}"
     return {"year": y, "month": m, "start": start, "end": end}
 
 def safe_float(x):
     try: return float(x)
     except: return 0.0
 
-def safe_int(x):
-    try: return int(x)
-    except: return 0
-
-def retry_request(method, url, headers=None, json_body=None, timeout=60, max_attempts=3, backoff=0.8):
+# Opt-in on-disk cache of successful API responses, for re-runs over the same date windows. Off unless
+# MONTHLY_METRICS_CACHE_DIR is set and configure_response_cache() sets a ttl; the salt keeps run days apart.
+RESPONSE_CACHE_DIR = os.path.expanduser(os.environ["MONTHLY_METRICS_CACHE_DIR"]) if os.environ.get("MONTHLY_METRICS_CACHE_DIR") else None
+RESPONSE_CACHE_TTL = 0
+RESPONSE_CACHE_SALT = ""
+
+def configure_response_cache(ttl_seconds, salt):
+    global RESPONSE_CACHE_TTL, RESPONSE_CACHE_SALT
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_SALT = ttl_seconds, salt
+
+def disk_cached(fn):
+    # Keyed by the caller's credentials + method + URL + body, so one token never reads responses fetched
+    # with another; the Authorization value only ever enters the hash, never the cache files.
+    @functools.wraps(fn)
+    async def wrapper(session, method, url, headers=None, json_body=None, **kwargs):
+        if not RESPONSE_CACHE_DIR or RESPONSE_CACHE_TTL <= 0:
+            return await fn(session, method, url, headers=headers, json_body=json_body, **kwargs)
+        credentials = (headers or {}).get("Authorization", "")
+        key = hashlib.blake2b(json_dumps_bytes([RESPONSE_CACHE_SALT, credentials, method.upper(), url, json_body]), digest_size=16).hexdigest()
+        path = os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
+        try:
+            if time.time() - os.path.getmtime(path) < RESPONSE_CACHE_TTL:
+                with open(path, "rb") as f:
+                    return json_loads(f.read())
+        except (OSError, ValueError):
+            pass
+        data = await fn(session, method, url, headers=headers, json_body=json_body, **kwargs)
+        if data is not None:
+            try:
+                os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(json_dumps_bytes(data))
+                os.replace(tmp, path)
+            except OSError:
+                pass  # caching is best-effort
+        return data
+    return wrapper
+
+@disk_cached
+async def retry_request(session, method, url, headers=None, json_body=None, timeout=60, max_attempts=3, backoff=0.8,
+                        max_backoff=10.0, deadline=None):
+    # deadline: time.monotonic() value past which no attempt or backoff sleep is started.
     for attempt in range(1, max_attempts+1):
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Deadline exceeded before {method.upper()} {url}")
+            timeout = min(timeout, remaining)
         try:
-            if method.upper() == "POST":
-                r = requests.post(url, headers=headers, json=json_body, timeout=timeout)
-            else:
-                r = requests.get(url, headers=headers, timeout=timeout)
-            # backoff on transient
-            if r.status_code in (429, 500, 502, 503, 504) and attempt < max_attempts:
-                time.sleep(backoff * (2 ** (attempt-1))); continue
-            r.raise_for_status()
-            return r.json()
-        except requests.HTTPError as e:
-            if attempt >= max_attempts:
-                try: err_payload = r.json()
-                except: err_payload = {"status_code": getattr(r, "status_code", None), "text": getattr(r, "text", None)}
-                raise RuntimeError(f"HTTP error {r.status_code}: {err_payload}") from e
-            time.sleep(backoff * (2 ** (attempt-1)))
+            # Pre-encoded bytes; aiohttp would label them octet-stream unless the caller set a Content-Type.
+            data = json_dumps_bytes(json_body) if json_body is not None else None
+            if data is not None and not (headers and "Content-Type" in headers):
+                headers = {**(headers or {}), "Content-Type": "application/json"}
+            async with session.request(method.upper(), url, headers=headers, data=data,
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+                # Read the body once (also lets the connection go back to the pool); parse only on success.
+                body = await r.read()
+                if r.status >= 400:
+                    raise RuntimeError(f"HTTP error {r.status}: {body.decode('utf-8', 'replace')[:2048]}")
+                return json_loads(body) if body.strip() else None
         except Exception:
             if attempt >= max_attempts: raise
-            time.sleep(backoff * (2 ** (attempt-1)))
+            # Capped exponential backoff with jitter so the concurrent GSC/GA calls don't retry in lockstep.
+            delay = min(max_backoff, backoff * (2 ** (attempt-1))) * (0.5 + random.random())
+            if deadline is not None and time.monotonic() + delay > deadline: raise
+            await asyncio.sleep(delay)
 
 # ---------- DB token helpers ----------
-def get_db_conn_from_env(database_url_cli=None):
+DB_CONNECT_TIMEOUT = 5  # seconds; a dead DB fails fast instead of stalling the run
+
+# database_url_cli -> pool. Threaded, since token lookups for different keys may run in parallel.
+_DB_POOLS = {}
+_DB_POOLS_LOCK = threading.Lock()
+
+def _db_connect_params(database_url_cli=None):
     url = database_url_cli or os.environ.get("DATABASE_URL")
     if url:
-        return psycopg2.connect(url)
+        return {"dsn": url}
 
     host = os.environ.get("POSTGRES_HOST") or os.environ.get("DB_HOST")
     port = os.environ.get("POSTGRES_PORT") or os.environ.get("DB_PORT") or "5432"
@@ -104,7 +172,18 @@ def get_db_conn_from_env(database_url_cli=None):
 
     if not all([host, db, user, pwd]):
         return None
-    return psycopg2.connect(host=host, port=port, dbname=db, user=user, password=pwd)
+    return {"host": host, "port": port, "dbname": db, "user": user, "password": pwd}
+
+def get_db_pool(database_url_cli=None):
+    with _DB_POOLS_LOCK:
+        pool = _DB_POOLS.get(database_url_cli)
+        if pool is None:
+            params = _db_connect_params(database_url_cli)
+            if not params:
+                return None
+            pool = _DB_POOLS[database_url_cli] = psycopg2.pool.ThreadedConnectionPool(
+                1, 2, connect_timeout=DB_CONNECT_TIMEOUT, **params)
+        return pool
 
 # Expect a table like:
 #   oauth_tokens (
@@ -134,17 +213,23 @@ def load_google_token_bundle(conn, token_key: str):
         row = cur.fetchone()
         return row
 
-def update_access_token(conn, token_key: str, access_token: str, expires_at_iso: str):
+def update_access_token(conn, token_key: str, access_token: str, expires_at_iso: str, stale_before):
+    # Only overwrite a token that is still stale; if another process refreshed it meanwhile, no row
+    # matches and the caller should use that token instead. Returns True if this write won.
     sql = """
       UPDATE oauth_tokens
          SET access_token = %s,
              expires_at   = %s,
              updated_at   = NOW()
        WHERE provider = 'google' AND token_key = %s
+         AND (access_token IS NULL OR expires_at IS NULL OR expires_at <= %s)
+      RETURNING access_token
     """
     with conn.cursor() as cur:
-        cur.execute(sql, (access_token, expires_at_iso, token_key))
+        cur.execute(sql, (access_token, expires_at_iso, token_key, stale_before))
+        updated = cur.rowcount > 0
     conn.commit()
+    return updated
 
 def mint_access_token_from_refresh(client_id, client_secret, refresh_token):
     url = "https://oauth2.googleapis.com/token"
@@ -154,74 +239,115 @@ def mint_access_token_from_refresh(client_id, client_secret, refresh_token):
         "client_secret": client_secret,
         "refresh_token": refresh_token,
     }
-    r = requests.post(url, data=payload, timeout=60)
+    r = SESSION.post(url, data=payload, timeout=60)
     r.raise_for_status()
     return r.json()  # { access_token, expires_in, scope, token_type, ... }
 
-def get_access_token_from_db(database_url_cli, token_key):
-    conn = get_db_conn_from_env(database_url_cli)
-    if not conn:
+# token_key -> (access_token, expires_at); lets repeat lookups in one process skip the DB.
+_TOKEN_CACHE = {}
+# token_key -> Lock, so concurrent callers for one key share a single refresh (single-flight).
+_REFRESH_LOCKS = {}
+
+def _cached_token(token_key, buffer):
+    cached = _TOKEN_CACHE.get(token_key)
+    if cached and cached[1] - datetime.now(timezone.utc) > buffer:
+        return cached[0]
+    return None
+
+def get_access_token_from_db(database_url_cli, token_key, refresh_buffer_seconds=120):
+    buffer = timedelta(seconds=refresh_buffer_seconds)
+    token = _cached_token(token_key, buffer)
+    if token:
+        return token
+    with _REFRESH_LOCKS.setdefault(token_key, threading.Lock()):
+        # Whoever held the lock before us may have just refreshed this key.
+        return _cached_token(token_key, buffer) or _load_or_refresh_token(database_url_cli, token_key, buffer)
+
+def _load_or_refresh_token(database_url_cli, token_key, buffer):
+    pool = get_db_pool(database_url_cli)
+    if not pool:
         raise RuntimeError("Database connection not configured. Provide --database-url or set DATABASE_URL/POSTGRES_* envs.")
-    bundle = load_google_token_bundle(conn, token_key)
-    if not bundle:
-        conn.close()
-        raise RuntimeError(f"No google token bundle found for token_key='{token_key}'")
-
-    access_token = bundle.get("access_token")
-    refresh_token = bundle.get("refresh_token")
-    client_id = bundle.get("client_id")
-    client_secret = bundle.get("client_secret")
-    expires_at = bundle.get("expires_at")  # may be None
-
-    now = datetime.now(timezone.utc)
-    # Refresh if missing or expiring within 2 minutes
-    needs_refresh = (not access_token) or (not expires_at) or (expires_at <= now + timedelta(seconds=120))
-
-    if needs_refresh:
-        if not (refresh_token and client_id and client_secret):
-            conn.close()
-            raise RuntimeError("Token refresh required but refresh_token/client_id/client_secret missing in DB row.")
-        token_resp = mint_access_token_from_refresh(client_id, client_secret, refresh_token)
-        access_token = token_resp["access_token"]
-        # Compute new expiry
-        expires_in = int(token_resp.get("expires_in", 3600))
-        new_exp = now + timedelta(seconds=expires_in)
-        update_access_token(conn, token_key, access_token, new_exp.isoformat())
-    conn.close()
+    conn = pool.getconn()
+    try:
+        bundle = load_google_token_bundle(conn, token_key)
+        if not bundle:
+            raise RuntimeError(f"No google token bundle found for token_key='{token_key}'")
+
+        access_token = bundle.get("access_token")
+        refresh_token = bundle.get("refresh_token")
+        client_id = bundle.get("client_id")
+        client_secret = bundle.get("client_secret")
+        expires_at = bundle.get("expires_at")  # may be None
+
+        now = datetime.now(timezone.utc)
+        # Refresh only if missing or expiring within the buffer
+        needs_refresh = (not access_token) or (not expires_at) or (expires_at <= now + buffer)
+
+        if needs_refresh:
+            if not (refresh_token and client_id and client_secret):
+                raise RuntimeError("Token refresh required but refresh_token/client_id/client_secret missing in DB row.")
+            token_resp = mint_access_token_from_refresh(client_id, client_secret, refresh_token)
+            access_token = token_resp["access_token"]
+            # Compute new expiry
+            expires_in = int(token_resp.get("expires_in", 3600))
+            expires_at = now + timedelta(seconds=expires_in)
+            if not update_access_token(conn, token_key, access_token, expires_at.isoformat(), now + buffer):
+                # Lost the race to another process: keep the stored token so only ours goes unused.
+                bundle = load_google_token_bundle(conn, token_key) or {}
+                if bundle.get("access_token") and bundle.get("expires_at"):
+                    access_token, expires_at = bundle["access_token"], bundle["expires_at"]
+    finally:
+        pool.putconn(conn)
+    _TOKEN_CACHE[token_key] = (access_token, expires_at)
     return access_token
 
 # ---------- GSC ----------
-def gsc_by_page(start_date, end_date, row_limit, start_row, endpoint, headers, dimension_filter_groups=None):
-    body = {
-        "startDate": start_date,
-        "endDate": end_date,
-        "dimensions": ["page"],
-        "rowLimit": row_limit,
-        "startRow": start_row
-    }
+# Invariant part of every searchAnalytics body; the shared objects are never mutated.
+_GSC_BODY_TEMPLATE = {"dimensions": ["page"]}
+
+async def gsc_by_page(session, start_date, end_date, row_limit, start_row, endpoint, headers, dimension_filter_groups=None, deadline=None):
+    body = {"startDate": start_date, "endDate": end_date, **_GSC_BODY_TEMPLATE, "rowLimit": row_limit, "startRow": start_row}
     if dimension_filter_groups:
         body["dimensionFilterGroups"] = dimension_filter_groups
-    data = retry_request("POST", endpoint, headers=headers, json_body=body)
+    data = await retry_request(session, "POST", endpoint, headers=headers, json_body=body, deadline=deadline)
     return data.get("rows", []) or [], body
 
-def aggregate_gsc_by_page(rows):
-    clicks = impressions = 0
-    wpos = 0.0
-    clean_rows = []
-    for r in rows:
-        k = r.get("keys", [])
-        page = k[0] if k else None
-        c = safe_int(r.get("clicks", 0))
-        i = safe_int(r.get("impressions", 0))
-        pos = safe_float(r.get("position", 0))
-        clicks += c; impressions += i; wpos += pos * i
-        clean_rows.append({
-            "page": page,
-            "clicks": c,
-            "impressions": i,
-            "ctr": safe_float(r.get("ctr", 0.0)),
-            "position": pos
-        })
+GSC_MAX_ROWS_PER_REQUEST = 25000  # API cap on rowLimit
+
+async def gsc_by_page_paginated(session, start_date, end_date, row_limit, endpoint, headers, sem, deadline=None):
+    # First page tells us whether there is more; the rest are fetched concurrently with startRow.
+    page_size = min(row_limit, GSC_MAX_ROWS_PER_REQUEST)
+
+    async def fetch_page(limit, start_row):
+        async with sem:
+            return await gsc_by_page(session, start_date, end_date, limit, start_row, endpoint, headers, deadline=deadline)
+
+    rows, body = await fetch_page(page_size, 0)
+    if len(rows) == page_size and row_limit > page_size:
+        pages = await asyncio.gather(*(
+            fetch_page(min(page_size, row_limit - start), start)
+            for start in range(page_size, row_limit, page_size)
+        ))
+        for page_rows, _ in pages:
+            rows.extend(page_rows)
+    return rows, body
+
+def aggregate_gsc_by_page(rows, include_rows=True):
+    n = len(rows)
+    clicks_arr = np.fromiter((r.get("clicks") or 0 for r in rows), dtype=np.float64, count=n)
+    impressions_arr = np.fromiter((r.get("impressions") or 0 for r in rows), dtype=np.float64, count=n)
+    position_arr = np.fromiter((r.get("position") or 0.0 for r in rows), dtype=np.float64, count=n)
+    clean_rows = [{
+        "page": (r.get("keys") or [None])[0],
+        "clicks": r.get("clicks") or 0,
+        "impressions": r.get("impressions") or 0,
+        "ctr": r.get("ctr") or 0.0,
+        "position": r.get("position") or 0.0
+    } for r in rows] if include_rows else None
+
+    clicks = int(round(clicks_arr.sum()))
+    impressions = int(round(impressions_arr.sum()))
+    wpos = float((position_arr * impressions_arr).sum())
     ctr = (clicks / impressions) * 100 if impressions > 0 else 0.0
     avg_pos = (wpos / impressions) if impressions > 0 else 0.0
     return {
@@ -236,93 +362,160 @@ def pct_change(curr, prev):
     return round((curr - prev) / prev * 100.0, 2)
 
 # ---------- GA ----------
-def ga_run_report(start_date, end_date, property_id, headers):
+# Metric order of the runReport request; also the column order of parse_ga_rows' array.
+GA_METRICS = ["sessions","totalUsers","newUsers","screenPageViews","eventCount","userEngagementDuration","bounceRate","engagementRate"]
+SESSIONS, TOTAL_USERS, NEW_USERS, PAGEVIEWS, EVENT_COUNT, ENGAGEMENT_SECONDS, BOUNCE_RATE, ENGAGEMENT_RATE = range(len(GA_METRICS))
+
+# Everything in the runReport body except dateRanges; built once at import.
+_GA_BODY_TEMPLATE = {
+    "metrics": [{"name": n} for n in GA_METRICS],
+    "dimensions": [{"name": "sessionDefaultChannelGroup"}],
+    "limit": 1000
+}
+
+async def ga_run_report(session, date_ranges, property_id, headers, deadline=None):
+    # date_ranges: [(name, start_date, end_date), ...]; several ranges share one request.
     url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}:runReport"
-    metrics = [{"name": n} for n in [
-        "sessions","totalUsers","newUsers","screenPageViews","eventCount","userEngagementDuration","bounceRate","engagementRate"
-    ]]
-    body = {
-        "dateRanges": [{"startDate": start_date, "endDate": end_date, "name": "report"}],
-        "metrics": metrics,
-        "dimensions": [{"name": "sessionDefaultChannelGroup"}],
-        "limit": 1000
-    }
-    data = retry_request("POST", url, headers=headers, json_body=body)
+    body = {"dateRanges": [{"startDate": start, "endDate": end, "name": name} for name, start, end in date_ranges],
+            **_GA_BODY_TEMPLATE}
+    data = await retry_request(session, "POST", url, headers=headers, json_body=body, deadline=deadline)
     return data, body
 
-def parse_ga_rows(report_json):
+def split_ga_report(report_json):
+    # With several dateRanges GA appends a "dateRange" dimension holding the range name;
+    # returns {range_name: {"rows": [...]}} so each part parses like a single-range report.
     rows = report_json.get("rows", []) or []
-    out = []
+    if not rows:
+        return {}
+    dim_names = [h.get("name") for h in report_json.get("dimensionHeaders", [])]
+    if "dateRange" not in dim_names:
+        raise RuntimeError(f"GA report has no dateRange dimension to split on (dimensions: {dim_names})")
+    idx = dim_names.index("dateRange")
+    by_range = {}
     for r in rows:
-        dim_vals = [dv.get("value") for dv in r.get("dimensionValues", [])]
-        met_vals = [mv.get("value") for mv in r.get("metricValues", [])]
-        out.append({
-            "sessionDefaultChannelGroup": dim_vals[0] if dim_vals else "(not set)",
-            "sessions": safe_float(met_vals[0] if len(met_vals)>0 else 0),
-            "totalUsers": safe_float(met_vals[1] if len(met_vals)>1 else 0),
-            "newUsers": safe_float(met_vals[2] if len(met_vals)>2 else 0),
-            "screenPageViews": safe_float(met_vals[3] if len(met_vals)>3 else 0),
-            "eventCount": safe_float(met_vals[4] if len(met_vals)>4 else 0),
-            "userEngagementDuration": safe_float(met_vals[5] if len(met_vals)>5 else 0),
-            "bounceRate": safe_float(met_vals[6] if len(met_vals)>6 else 0),
-            "engagementRate": safe_float(met_vals[7] if len(met_vals)>7 else 0),
-        })
-    return out
-
-def aggregate_ga(rows):
-    sessions = sum(r["sessions"] for r in rows)
-    total_users = sum(r["totalUsers"] for r in rows)
-    new_users = sum(r["newUsers"] for r in rows)
-    pageviews = sum(r["screenPageViews"] for r in rows)
-    event_count = sum(r["eventCount"] for r in rows)
-    engagement_seconds = sum(r["userEngagementDuration"] for r in rows)
+        dims = r.get("dimensionValues") or [{}]
+        by_range.setdefault(dims[idx].get("value"), []).append(r)
+    return {name: {"rows": rows} for name, rows in by_range.items()}
+
+def parse_ga_rows(report_json):
+    # Returns (channel_groups, metrics); metrics is an (n_rows, len(GA_METRICS)) float array.
+    rows = report_json.get("rows", []) or []
+    groups = [(r.get("dimensionValues") or [{}])[0].get("value", "(not set)") for r in rows]
+    met_vals = [mv.get("value") for r in rows for mv in r.get("metricValues", [])]
+    try:
+        # GA returns every metric as a numeric string; convert them all in one C-level pass.
+        arr = np.asarray(met_vals, dtype=np.float64).reshape(len(rows), len(GA_METRICS))
+    except (TypeError, ValueError):
+        arr = np.zeros((len(rows), len(GA_METRICS)), dtype=np.float64)
+        for i, r in enumerate(rows):
+            for j, mv in enumerate(r.get("metricValues", [])[:len(GA_METRICS)]):
+                arr[i, j] = safe_float(mv.get("value"))
+    return groups, arr
+
+def ga_rows_as_dicts(groups, arr):
+    return [{"sessionDefaultChannelGroup": g, **dict(zip(GA_METRICS, vals))} for g, vals in zip(groups, arr.tolist())]
+
+def _weighted_ga(arr):
+    # Column sums plus session-weighted bounce/engagement rates for a block of GA rows.
+    totals = arr.sum(axis=0)
+    sessions = float(totals[SESSIONS])
+    if sessions > 0:
+        w_bounce = float(arr[:, BOUNCE_RATE] @ arr[:, SESSIONS]) / sessions
+        w_engage = float(arr[:, ENGAGEMENT_RATE] @ arr[:, SESSIONS]) / sessions
+    else:
+        w_bounce = w_engage = 0.0
+    return totals, w_bounce, w_engage
+
+def aggregate_ga(groups, arr):
+    totals, w_bounce, w_engage = _weighted_ga(arr)
+    sessions = float(totals[SESSIONS])
+    pageviews = float(totals[PAGEVIEWS])
+    engagement_seconds = float(totals[ENGAGEMENT_SECONDS])
 
     if sessions > 0:
-        w_bounce = sum((r["bounceRate"] or 0) * r["sessions"] for r in rows) / sessions
-        w_engage = sum((r["engagementRate"] or 0) * r["sessions"] for r in rows) / sessions
         pages_per_session = pageviews / sessions if pageviews else 0.0
         avg_secs = engagement_seconds / sessions
     else:
-        w_bounce = w_engage = pages_per_session = avg_secs = 0.0
-
-    org = [r for r in rows if (r.get("sessionDefaultChannelGroup") or "").lower() == "organic search"]
-    if org:
-        org_sessions = sum(r["sessions"] for r in org)
-        org_users = sum(r["totalUsers"] for r in org)
-        org_pageviews = sum(r["screenPageViews"] for r in org)
-        org_bounce = sum((r["bounceRate"] or 0) * r["sessions"] for r in org) / org_sessions if org_sessions>0 else 0.0
-        org_engage = sum((r["engagementRate"] or 0) * r["sessions"] for r in org) / org_sessions if org_sessions>0 else 0.0
-    else:
-        org_sessions = org_users = org_pageviews = 0.0
-        org_bounce = org_engage = 0.0
+        pages_per_session = avg_secs = 0.0
+
+    mask = np.array([(g or "").lower() == "organic search" for g in groups], dtype=bool)
+    org_totals, org_bounce, org_engage = _weighted_ga(arr[mask])
 
     return {
         "sessions": int(round(sessions)),
-        "totalUsers": int(round(total_users)),
-        "newUsers": int(round(new_users)),
+        "totalUsers": int(round(totals[TOTAL_USERS])),
+        "newUsers": int(round(totals[NEW_USERS])),
         "pageviews": int(round(pageviews)),
-        "eventCount": int(round(event_count)),
+        "eventCount": int(round(totals[EVENT_COUNT])),
         "engagementSeconds": int(round(engagement_seconds)),
         "bounceRate": round(w_bounce, 2),
         "engagementRate": round(w_engage, 2),
         "pagesPerSession": round(pages_per_session, 2),
         "avgSessionSeconds": int(round(avg_secs)),
         "organic": {
-            "sessions": int(round(org_sessions)),
-            "users": int(round(org_users)),
-            "pageviews": int(round(org_pageviews)),
+            "sessions": int(round(org_totals[SESSIONS])),
+            "users": int(round(org_totals[TOTAL_USERS])),
+            "pageviews": int(round(org_totals[PAGEVIEWS])),
             "bounceRate": round(org_bounce, 2),
             "engagementRate": round(org_engage, 2)
         }
     }
 
+def parse_and_aggregate_ga(report_json, include_rows=False):
+    # One parse of the report feeds both the totals and (optionally) the per-channel rows.
+    groups, arr = parse_ga_rows(report_json)
+    rows = ga_rows_as_dicts(groups, arr) if include_rows else None
+    return rows, aggregate_ga(groups, arr)
+
 def pct_change_safe(curr, prev):
     if prev is None or prev == 0:
         return None
     return round((curr - prev) / prev * 100.0, 2)
 
+# ---------- Deltas ----------
+def delta(ndigits):
+    return lambda curr, prev: round(curr - prev, ndigits)
+
+# (output key, path into the totals dict, fn(curr, prev))
+GSC_MOM_SPECS = (
+    ("clicks_change_pct",      ("clicks",),       pct_change),
+    ("impressions_change_pct", ("impressions",),  pct_change),
+    ("ctr_change_pct",         ("ctr",),          pct_change),
+    ("avg_position_delta",     ("avg_position",), delta(1)),
+)
+
+GA_YOY_SPECS = (
+    ("sessions_change_pct",            ("sessions",),              pct_change_safe),
+    ("users_change_pct",               ("totalUsers",),            pct_change_safe),
+    ("pageviews_change_pct",           ("pageviews",),             pct_change_safe),
+    ("bounce_rate_delta_pp",           ("bounceRate",),            delta(2)),
+    ("engagement_rate_delta_pp",       ("engagementRate",),        delta(2)),
+    ("pages_per_session_change_pct",   ("pagesPerSession",),       pct_change_safe),
+    ("avg_session_seconds_change_pct", ("avgSessionSeconds",),     pct_change_safe),
+    ("events_change_pct",              ("eventCount",),            pct_change_safe),
+    ("organic_sessions_change_pct",    ("organic", "sessions"),    pct_change_safe),
+    ("organic_users_change_pct",       ("organic", "users"),       pct_change_safe),
+    ("organic_pageviews_change_pct",   ("organic", "pageviews"),   pct_change_safe),
+    ("organic_bounce_delta_pp",        ("organic", "bounceRate"),  delta(2)),
+    ("organic_engagement_delta_pp",    ("organic", "engagementRate"), delta(2)),
+)
+
+def compute_deltas(specs, curr, prev):
+    return {key: fn(functools.reduce(operator.getitem, path, curr), functools.reduce(operator.getitem, path, prev))
+            for key, path, fn in specs}
+
+def write_json(obj):
+    # Streams the result to stdout without building an intermediate str.
+    if orjson is not None:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE))
+        sys.stdout.buffer.flush()
+    else:
+        json.dump(obj, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+
 # ---------- Main ----------
-def main():
+async def main_async():
     ap = argparse.ArgumentParser()
     ap.add_argument("--encoded-site-url", help="GSC encoded site URL (preferred)")
     ap.add_argument("--site-url", help="GSC site URL (will be URL-encoded if provided)")
@@ -333,9 +526,13 @@ def main():
     ap.add_argument("--ga-access-token", help="GA access token (defaults to --access-token)")
     ap.add_argument("--db-token-key", help="Lookup key in oauth_tokens.token_key (uses DB to mint/refresh token)")
     ap.add_argument("--database-url", help="Postgres connection URL (optional, or use env)")
+    ap.add_argument("--refresh-buffer-seconds", type=int, default=120, help="Refresh the DB token when it expires within this many seconds (default 120)")
 
-    ap.add_argument("--row-limit-gsc", type=int, default=100, help="Top N pages per month (default 100)")
+    ap.add_argument("--row-limit-gsc", type=int, default=100, help="Top N pages per month (default 100); above 25000 the rows are fetched in pages")
     ap.add_argument("--current-date", help="YYYY-MM-DD (default: now UTC)")
+    ap.add_argument("--deadline-seconds", type=float, default=180, help="Give up on the GSC/GA requests (incl. retries) after this many seconds (default 180)")
+    ap.add_argument("--cache-ttl-seconds", type=int, default=86400, help="With MONTHLY_METRICS_CACHE_DIR set, reuse API responses cached there for this long; 0 disables (default 86400)")
+    ap.add_argument("--include-rows", action="store_true", help="Include per-page / per-channel rows in the output (default: totals and deltas only)")
     args = ap.parse_args()
 
     encoded_site_url = args.encoded_site_url or encode_site_url(args.site_url)
@@ -348,7 +545,7 @@ def main():
 
     if not access_token and args.db_token_key:
         try:
-            access_token = get_access_token_from_db(args.database_url, args.db_token_key)
+            access_token = get_access_token_from_db(args.database_url, args.db_token_key, args.refresh_buffer_seconds)
         except Exception as e:
             print(json.dumps({"error":"db_token_error", "detail": str(e)})); sys.exit(1)
 
@@ -369,6 +566,9 @@ def main():
     except Exception:
         today = datetime.now(timezone.utc)
 
+    # A new run day never reuses responses cached on an earlier day.
+    configure_response_cache(args.cache_ttl_seconds, today.date().isoformat())
+
     cm_anchor  = last_full_month_anchor(today)
     lm_anchor  = first_day_utc((cm_anchor - timedelta(days=1)).year, (cm_anchor - timedelta(days=1)).month)
     yoy_anchor = first_day_utc(cm_anchor.year - 1, cm_anchor.month)
@@ -377,48 +577,36 @@ def main():
     LM  = month_info_from_anchor(lm_anchor)
     YOY = month_info_from_anchor(yoy_anchor)
 
-    # ----- GSC -----
+    # ----- Requests -----
     gsc_endpoint = f"https://searchconsole.googleapis.com/webmasters/v3/sites/{encoded_site_url}/searchAnalytics/query"
     gsc_headers  = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    ga_headers   = gsc_headers if ga_access_token == access_token else {"Authorization": f"Bearer {ga_access_token}", "Content-Type": "application/json"}
+
+    # The four reports are independent; run them concurrently. The connector caps in-flight
+    # requests so a slow endpoint isn't hammered with extra retries.
+    deadline = time.monotonic() + args.deadline_seconds
+    connector = aiohttp.TCPConnector(limit=8, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        gsc_sem = asyncio.Semaphore(5)  # GSC quota: at most 5 searchAnalytics calls in flight
+        (cm_rows, cm_body), (lm_rows, lm_body), (ga_json, ga_body) = await asyncio.gather(
+            gsc_by_page_paginated(session, CM["start"], CM["end"], args.row_limit_gsc, gsc_endpoint, gsc_headers, gsc_sem, deadline),
+            gsc_by_page_paginated(session, LM["start"], LM["end"], args.row_limit_gsc, gsc_endpoint, gsc_headers, gsc_sem, deadline),
+            ga_run_report(session, [("cm", CM["start"], CM["end"]), ("yoy", YOY["start"], YOY["end"])],
+                          args.ga_property_id, ga_headers, deadline),
+        )
 
-    cm_rows, cm_body = gsc_by_page(CM["start"], CM["end"], args.row_limit_gsc, 0, gsc_endpoint, gsc_headers)
-    lm_rows, lm_body = gsc_by_page(LM["start"], LM["end"], args.row_limit_gsc, 0, gsc_endpoint, gsc_headers)
-
-    cm_totals, cm_rows_clean = aggregate_gsc_by_page(cm_rows)
-    lm_totals, lm_rows_clean = aggregate_gsc_by_page(lm_rows)
+    # ----- GSC -----
+    cm_totals, cm_rows_clean = aggregate_gsc_by_page(cm_rows, args.include_rows)
+    lm_totals, lm_rows_clean = aggregate_gsc_by_page(lm_rows, args.include_rows)
 
-    mom = {
-        "clicks_change_pct":       pct_change(cm_totals["clicks"],      lm_totals["clicks"]),
-        "impressions_change_pct":  pct_change(cm_totals["impressions"], lm_totals["impressions"]),
-        "ctr_change_pct":          pct_change(cm_totals["ctr"],         lm_totals["ctr"]) if lm_totals["ctr"] else None,
-        "avg_position_delta":      round(cm_totals["avg_position"] - lm_totals["avg_position"], 1)
-    }
+    mom = compute_deltas(GSC_MOM_SPECS, cm_totals, lm_totals)
 
     # ----- GA -----
-    ga_headers = {"Authorization": f"Bearer {ga_access_token}", "Content-Type": "application/json"}
-    ga_cm_json, ga_cm_body   = ga_run_report(CM["start"],  CM["end"],  args.ga_property_id, ga_headers)
-    ga_yoy_json, ga_yoy_body = ga_run_report(YOY["start"], YOY["end"], args.ga_property_id, ga_headers)
-
-    ga_cm_rows   = parse_ga_rows(ga_cm_json)
-    ga_yoy_rows  = parse_ga_rows(ga_yoy_json)
-    ga_cm_totals  = aggregate_ga(ga_cm_rows)
-    ga_yoy_totals = aggregate_ga(ga_yoy_rows)
-
-    ga_yoy_deltas = {
-        "sessions_change_pct":            pct_change_safe(ga_cm_totals["sessions"],        ga_yoy_totals["sessions"]),
-        "users_change_pct":               pct_change_safe(ga_cm_totals["totalUsers"],      ga_yoy_totals["totalUsers"]),
-        "pageviews_change_pct":           pct_change_safe(ga_cm_totals["pageviews"],       ga_yoy_totals["pageviews"]),
-        "bounce_rate_delta_pp":           round(ga_cm_totals["bounceRate"] - ga_yoy_totals["bounceRate"], 2),
-        "engagement_rate_delta_pp":       round(ga_cm_totals["engagementRate"] - ga_yoy_totals["engagementRate"], 2),
-        "pages_per_session_change_pct":   pct_change_safe(ga_cm_totals["pagesPerSession"], ga_yoy_totals["pagesPerSession"]),
-        "avg_session_seconds_change_pct": pct_change_safe(ga_cm_totals["avgSessionSeconds"], ga_yoy_totals["avgSessionSeconds"]),
-        "events_change_pct":              pct_change_safe(ga_cm_totals["eventCount"],      ga_yoy_totals["eventCount"]),
-        "organic_sessions_change_pct":    pct_change_safe(ga_cm_totals["organic"]["sessions"],  ga_yoy_totals["organic"]["sessions"]),
-        "organic_users_change_pct":       pct_change_safe(ga_cm_totals["organic"]["users"],     ga_yoy_totals["organic"]["users"]),
-        "organic_pageviews_change_pct":   pct_change_safe(ga_cm_totals["organic"]["pageviews"], ga_yoy_totals["organic"]["pageviews"]),
-        "organic_bounce_delta_pp":        round(ga_cm_totals["organic"]["bounceRate"] - ga_yoy_totals["organic"]["bounceRate"], 2),
-        "organic_engagement_delta_pp":    round(ga_cm_totals["organic"]["engagementRate"] - ga_yoy_totals["organic"]["engagementRate"], 2),
-    }
+    ga_by_range = split_ga_report(ga_json)
+    ga_cm_rows,  ga_cm_totals  = parse_and_aggregate_ga(ga_by_range.get("cm", {}),  args.include_rows)
+    ga_yoy_rows, ga_yoy_totals = parse_and_aggregate_ga(ga_by_range.get("yoy", {}), args.include_rows)
+
+    ga_yoy_deltas = compute_deltas(GA_YOY_SPECS, ga_cm_totals, ga_yoy_totals)
 
     out = {
         "meta": {
@@ -434,14 +622,21 @@ def main():
             "lm_data": {"rows": lm_rows_clean}
         },
         "ga": {
-            "requests": {"cm_body": ga_cm_body, "yoy_body": ga_yoy_body},
+            "requests": {"cm_body": ga_body, "yoy_body": ga_body},  # one runReport covers both ranges
             "cm":  {"rows": ga_cm_rows,  "totals": ga_cm_totals},
             "yoy": {"rows": ga_yoy_rows, "totals": ga_yoy_totals},
             "yoy_deltas": ga_yoy_deltas
         }
     }
 
-    print(json.dumps(out, ensure_ascii=False))
+    if not args.include_rows:
+        for section in (out["gsc"]["cm_data"], out["gsc"]["lm_data"], out["ga"]["cm"], out["ga"]["yoy"]):
+            section.pop("rows", None)
+
+    write_json(out)
+
+def main():
+    asyncio.run(main_async())
 
 if __name__ == "__main__":
     main()